@@ -1,5 +1,9 @@
 #!/usr/bin/env python3
-import os, sys, argparse, configparser
+import os, re, sys, argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from itertools import islice
 from urllib.parse import quote
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -7,65 +11,124 @@ CONFIG_FILE = os.path.join(BASE_DIR, 'config.ini')
 DEFAULT_CONFIG = os.path.join(BASE_DIR, 'config_default.ini')
 COMMITS_INI = os.path.join(BASE_DIR, 'libretro_commits.ini')
 
+# Characters str.isalnum() rejects: ASCII bytes for the translate fast path, regex for the rest
+_NON_ALNUM_ASCII = bytes(i for i in range(128) if not chr(i).isalnum())
+_NON_ALNUM_RE = re.compile(r"[\W_]+")
+
 def _normalize_key(name: str) -> str:
-    return ''.join(c for c in name.lower() if c.isalnum())
+    s = name.lower()
+    if s.isascii():
+        return s.encode('ascii').translate(None, _NON_ALNUM_ASCII).decode('ascii')
+    return _NON_ALNUM_RE.sub('', s)
+
+# Filenames that only use these characters can be URL-quoted with a few str.replace calls;
+# anything else (e.g. '%', non-ASCII) goes through urllib's quote()
+_FAST_QUOTE_CHARS = " ()&',!+[]"
+_FAST_QUOTE_PAIRS = [(c, quote(c)) for c in _FAST_QUOTE_CHARS]
+_FAST_QUOTE_OK = re.compile(r"[A-Za-z0-9._~/\-" + re.escape(_FAST_QUOTE_CHARS) + "]*").fullmatch
+
+def _quote(fn: str) -> str:
+    if not _FAST_QUOTE_OK(fn):
+        return quote(fn)
+    for c, enc in _FAST_QUOTE_PAIRS:
+        if c in fn:
+            fn = fn.replace(c, enc)
+    return fn
 
 def _repo_name_from_system_folder(system_folder: str) -> str:
     return system_folder.replace(' - ', '_-_').replace(' ', '_')
 
-def _load_config():
-    cfg = configparser.ConfigParser()
+_INI_KV = re.compile(r"([^=:]*)[=:](.*)")
+
+def _read_ini(path: str, lower_keys: bool = False) -> dict:
+    # Small reader for our flat INIs ([section] / key = value / '#' or ';' comments).
+    # Unlike configparser it keeps key case, so system names can be used as keys;
+    # lower_keys=True matches configparser for config.ini (e.g. 'Client_ID =').
+    out, section = {}, None
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            s = line.strip()
+            if not s or s[0] in '#;':
+                continue
+            if s[0] == '[' and s[-1] == ']':
+                section = out.setdefault(s[1:-1].strip(), {})
+                continue
+            m = _INI_KV.match(s)
+            if m and section is not None:
+                k = m.group(1).strip()
+                section[k.lower() if lower_keys else k] = m.group(2).strip()
+    return out
+
+def _load_config() -> dict:
     if os.path.exists(CONFIG_FILE):
-        cfg.read(CONFIG_FILE)
-    elif os.path.exists(DEFAULT_CONFIG):
-        cfg.read(DEFAULT_CONFIG)
-    return cfg
+        return _read_ini(CONFIG_FILE, lower_keys=True)
+    if os.path.exists(DEFAULT_CONFIG):
+        return _read_ini(DEFAULT_CONFIG, lower_keys=True)
+    return {}
 
-def _thumbs_root(cfg) -> str:
+def _thumbs_root(cfg: dict) -> str:
     env = os.environ.get('RETROARCH_THUMBS_ROOT', os.path.join(BASE_DIR, 'retroarch-thumbnails', 'thumbnails'))
-    return cfg.get('mister', 'retroarch_thumbs_root', fallback=env) if cfg.has_section('mister') else env
+    return cfg.get('mister', {}).get('retroarch_thumbs_root', env)
 
 def _load_commits(path: str) -> dict:
     if not os.path.isfile(path):
         return {}
-    c = configparser.ConfigParser()
-    c.read(path)
-    return {k: v for k, v in c.items('commits')} if c.has_section('commits') else {}
+    return _read_ini(path).get('commits', {})
+
+def _process_system(root: str, commits: dict, system_folder: str) -> list:
+    rows = []
+    sys_path = os.path.join(root, system_folder)
+    art_dir = os.path.join(sys_path, 'Named_Boxarts')
+    if not os.path.isdir(art_dir):
+        return rows
+    repo = _repo_name_from_system_folder(system_folder)
+    commit = commits.get(system_folder, 'master')
+    raw_prefix = f"https://raw.githubusercontent.com/libretro-thumbnails/{repo}/{commit}/Named_Boxarts/"
+    blob_prefix = f"https://github.com/libretro-thumbnails/{repo}/blob/{commit}/Named_Boxarts/"
+    try:
+        with os.scandir(art_dir) as it:
+            entries = sorted((e for e in it if e.name.lower().endswith('.png')), key=lambda e: e.name)
+        for entry in entries:
+            fn = entry.name
+            stem, _ = os.path.splitext(fn)
+            key = _normalize_key(stem)
+            enc = _quote(fn)
+            raw_url = raw_prefix + enc
+            blob_url = blob_prefix + enc
+            rows.append((key, system_folder, fn, raw_url, blob_url, entry.path))
+    except Exception as e:
+        print(f"Skip {art_dir}: {e}")
+    return rows
 
 def build_cache(root: str, commits: dict, out_path: str):
     if not os.path.isdir(root):
         print(f"Thumbnails root not found: {root}")
         sys.exit(1)
 
-    rows = []
-    for system_folder in sorted(os.listdir(root)):
-        sys_path = os.path.join(root, system_folder)
-        art_dir = os.path.join(sys_path, 'Named_Boxarts')
-        if not os.path.isdir(art_dir): 
-            continue
-        repo = _repo_name_from_system_folder(system_folder)
-        commit = commits.get(system_folder, 'master')
-        try:
-            for fn in sorted(os.listdir(art_dir)):
-                if not fn.lower().endswith('.png'):
-                    continue
-                stem, _ = os.path.splitext(fn)
-                key = _normalize_key(stem)
-                enc = quote(fn)
-                raw_url = f"https://raw.githubusercontent.com/libretro-thumbnails/{repo}/{commit}/Named_Boxarts/{enc}"
-                blob_url = f"https://github.com/libretro-thumbnails/{repo}/blob/{commit}/Named_Boxarts/{enc}"
-                abs_path = os.path.join(art_dir, fn)
-                rows.append((key, system_folder, fn, raw_url, blob_url, abs_path))
-        except Exception as e:
-            print(f"Skip {art_dir}: {e}")
-
+    # Directory listing is syscall-bound, so systems are walked on a thread pool.
+    # Results are drained in sorted system order and at most `workers` systems are
+    # submitted ahead of the writer, so a slow system can't pile up the rest in memory.
+    with os.scandir(root) as it:
+        systems = sorted(e.name for e in it if e.is_dir())
     os.makedirs(os.path.dirname(out_path) or ".", exist_ok=True)
-    with open(out_path, "w", encoding="utf-8") as f:
-        f.write("key\tsystem\tfilename\traw_url\tblob_url\tabs_path\n")
-        for r in rows:
-            f.write("\t".join(r) + "\n")
+    tmp_path = out_path + ".tmp"
+    count = 0
+    workers = min(32, (os.cpu_count() or 1) * 4)
+    with open(tmp_path, "wb", buffering=1 << 20) as f, ThreadPoolExecutor(max_workers=workers) as ex:
+        f.write(b"key\tsystem\tfilename\traw_url\tblob_url\tabs_path\n")
+        process = partial(_process_system, root, commits)
+        todo = iter(systems)
+        pending = deque(ex.submit(process, s) for s in islice(todo, workers))
+        while pending:
+            part = pending.popleft().result()
+            nxt = next(todo, None)
+            if nxt is not None:
+                pending.append(ex.submit(process, nxt))
+            f.write("".join("\t".join(r) + "\n" for r in part).encode("utf-8"))
+            count += len(part)
+    os.replace(tmp_path, out_path)
 
-    print(f"Wrote {len(rows):,} entries -> {out_path}")
+    print(f"Wrote {count:,} entries -> {out_path}")
 
 def main():
     cfg = _load_config()
@@ -5,6 +5,8 @@ MiSTer FPGA Discord Rich Presence using Box Art Cache (TSV) + Fallback Asset
 Save as mister_discord_presence.py
 Dependencies:
     pip install pypresence requests
+Optional (much faster fuzzy matching on large caches / JSON decoding):
+    pip install rapidfuzz orjson
 
 Place your fallback PNG (e.g., mister_kun_bw.png) next to this script.
 
@@ -18,42 +20,94 @@ host = localhost
 port = 8182
 # optional: override cache path
 # boxart_cache = /absolute/or/relative/path/to/boxart_cache.txt
+# optional: log the top five box art candidates of every fuzzy lookup
+# boxart_debug = yes
 """
 
 import os
 import sys
 import time
+import json
+import hashlib
 import requests
 import configparser
 from datetime import datetime
-from difflib import get_close_matches
+from functools import lru_cache
+from requests.adapters import HTTPAdapter
 from pypresence import Presence
 from pypresence.exceptions import PipeClosed
-from urllib.parse import quote
 import re
+import heapq
+import bisect
+import mmap
+import pickle
 from difflib import SequenceMatcher
 
+try:
+    from rapidfuzz import process as _rf_process
+    from rapidfuzz.distance import Indel as _indel
+except ImportError:
+    _rf_process = _indel = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
 BAD_QUALIFIERS = {"demo", "kiosk", "beta", "prototype", "proto", "sample", "prerelease", "trial", "review", "event", "not for resale"}
 SOFT_QUALIFIERS = {"rev", "alt"}
 REGION_WORDS = {"usa", "europe", "japan", "world", "asia", "korea", "australia", "canada", "brazil"}
 
+def _any_word_re(words):
+    # one alternation scan instead of `any(w in text for w in words)`
+    return re.compile("|".join(map(re.escape, sorted(words, key=len, reverse=True))))
+
+_BAD_RE = _any_word_re(BAD_QUALIFIERS)
+_SOFT_RE = _any_word_re(SOFT_QUALIFIERS)
+_REGION_RE = _any_word_re(REGION_WORDS)
+_PAREN_RE = re.compile(r"\((.*?)\)")
+_PAREN_STRIP_RE = re.compile(r"\s*\([^)]*\)")
+_TOK_RE = re.compile(r"[a-z0-9]+")  # applied to lowered text only
+
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 CONFIG_FILE = os.path.join(BASE_DIR, 'config.ini')
 DEFAULT_CONFIG = os.path.join(BASE_DIR, 'config_default.ini')
 FALLBACK_IMG_PATH = os.path.join(BASE_DIR, 'mister_kun_bw.png')
+IMAGE_CHECKS_FILE = os.path.join(BASE_DIR, 'image_checks.json')
+
+_INI_KV = re.compile(r"([^=:]*)[=:](.*)")
+
+def _read_ini(path: str, lower_keys: bool = False) -> dict:
+    # Small reader for our flat INIs ([section] / key = value / '#' or ';' comments).
+    # Unlike configparser it keeps key case, so system names can be used as keys;
+    # lower_keys=True matches configparser for config.ini (e.g. 'Client_ID =').
+    out, section = {}, None
+    with open(path, encoding='utf-8-sig') as f:
+        for line in f:
+            s = line.strip()
+            if not s or s[0] in '#;':
+                continue
+            if s[0] == '[' and s[-1] == ']':
+                section = out.setdefault(s[1:-1].strip(), {})
+                continue
+            m = _INI_KV.match(s)
+            if m and section is not None:
+                k = m.group(1).strip()
+                section[k.lower() if lower_keys else k] = m.group(2).strip()
+    return out
 
-config = configparser.ConfigParser()
 if not os.path.exists(CONFIG_FILE):
     if os.path.exists(DEFAULT_CONFIG):
-        config.read(DEFAULT_CONFIG)
+        # configparser only for writing out the fresh config.ini
+        _defaults = configparser.ConfigParser()
+        _defaults.read(DEFAULT_CONFIG)
         with open(CONFIG_FILE, 'w') as cfg:
-            config.write(cfg)
+            _defaults.write(cfg)
         print(f"Created {CONFIG_FILE} from defaults.", flush=True)
     else:
         print("Default configuration file not found.", flush=True)
         sys.exit(1)
-else:
-    config.read(CONFIG_FILE)
+config = _read_ini(CONFIG_FILE, lower_keys=True)
 
 client_id = config['discord'].get('client_id', 'YOUR_CLIENT_ID_HERE')
 if client_id == 'YOUR_CLIENT_ID_HERE':
@@ -63,15 +117,16 @@ if client_id == 'YOUR_CLIENT_ID_HERE':
 mister_host = config['mister'].get('host', 'localhost')
 mister_port = config['mister'].get('port', '8182')
 BOXART_CACHE_FILE = config['mister'].get('boxart_cache', os.path.join(BASE_DIR, 'boxart_cache.txt'))
+# Log the runner-up candidates of every scored lookup
+BOXART_DEBUG = config['mister'].get('boxart_debug', '').lower() in ('1', 'true', 'yes', 'on')
+# Parsed copy of the TSV + indexes, rebuilt whenever the TSV's path, size or mtime changes
+BOXART_CACHE_PICKLE = os.path.splitext(BOXART_CACHE_FILE)[0] + '.pkl'
+# PRETTY_SYSTEMS -> cache system map, rebuilt whenever either side changes
+BOXART_ALIASES_FILE = os.path.splitext(BOXART_CACHE_FILE)[0] + '.aliases.json'
 
 # Optional per-system Discord asset map (for small_image)
 ASSETS_INI = os.path.join(BASE_DIR, 'discord_assets.ini')
-ASSETS = {}
-if os.path.isfile(ASSETS_INI):
-    _a = configparser.ConfigParser()
-    _a.read(ASSETS_INI)
-    if _a.has_section('assets'):
-        ASSETS = {k: v for k, v in _a.items('assets')}
+ASSETS = _read_ini(ASSETS_INI).get('assets', {}) if os.path.isfile(ASSETS_INI) else {}
 
 RPC = Presence(client_id)
 IMAGE_KEY = 'mister'
@@ -93,22 +148,72 @@ SYSTEM_MAP = {
     'Xbox 360': 'Microsoft - Xbox 360',
 }
 
+def _ratio(a: str, b: str, score_cutoff: float = 0.0) -> float:
+    # 2*M/T like SequenceMatcher.ratio() (M = true LCS), computed in C when rapidfuzz is available.
+    # Returns 0.0 as soon as the ratio is known to fall below score_cutoff.
+    if _indel is not None:
+        return _indel.normalized_similarity(a, b, score_cutoff=score_cutoff)
+    # length-only bound (real_quick_ratio) first, so clearly mismatched lengths never build a matcher
+    la, lb = len(a), len(b)
+    if score_cutoff and 2 * min(la, lb) < score_cutoff * (la + lb):
+        return 0.0
+    sm = SequenceMatcher(None, a, b)
+    if score_cutoff and sm.quick_ratio() < score_cutoff:
+        return 0.0
+    r = sm.ratio()
+    return r if r >= score_cutoff else 0.0
+
+# Characters str.isalnum() rejects: ASCII bytes for the translate fast path, regex for the rest
+_NON_ALNUM_ASCII = bytes(i for i in range(128) if not chr(i).isalnum())
+_NON_ALNUM_RE = re.compile(r"[\W_]+")
+
 def _normalize_key(name: str) -> str:
-    return ''.join(c for c in (name or '').lower() if c.isalnum())
+    s = (name or '').lower()
+    if s.isascii():
+        return s.encode('ascii').translate(None, _NON_ALNUM_ASCII).decode('ascii')
+    return _NON_ALNUM_RE.sub('', s)
 
 # --- Cache (TSV) ---
 # Expect header: key    system    filename    raw_url    blob_url    abs_path
-CACHE = []  # tuples: (system, filename, raw_url, blob_url, key)
+# tuples: (system, filename, raw_url, blob_url, key, abs_path, stem_lower, stem_len, cand_regions, cand_penalty)
+# the last four are filename-only scoring inputs precomputed at load (see _candidate_features)
+CACHE = []
+CACHE_BY_SYS = {}  # system -> [rows]
+# (system, lower stem) / (system, key) -> first matching row; system None indexes the whole cache
+STEM_INDEX = {}
+KEY_INDEX = {}
+# system (None = whole cache) -> (sorted key lengths, rows in that order), for length-window slices
+KEYLEN_INDEX = {None: ([], [])}
 _SYSTEMS_FROM_CACHE = set()
-_SYSTEM_ALIAS_MAP = None  # lazy-built map from pretty -> canonical
-
-def _load_boxart_cache():
-    global CACHE
-    if CACHE:
-        return
-    if not os.path.isfile(BOXART_CACHE_FILE):
-        print(f"Box art cache not found: {BOXART_CACHE_FILE}\nRun build_boxart_cache.py first.", flush=True)
-        return
+_SYSTEM_ALIAS_MAP = {}  # pretty -> canonical, built by main() once the cache is loaded
+
+_CACHE_PICKLE_VERSION = 4
+
+def _cache_pickle_fingerprint() -> str:
+    # rows carry precomputed _candidate_features, so a sidecar built with other word sets is stale
+    h = hashlib.sha1(str(_CACHE_PICKLE_VERSION).encode())
+    for words in (BAD_QUALIFIERS, SOFT_QUALIFIERS, REGION_WORDS):
+        h.update('\n'.join(sorted(words)).encode('utf-8') + b'\0')
+    return h.hexdigest()
+
+def _add_cache_row(key, system_folder, fn, raw_url, blob_url, abs_path=''):
+    # one shared str per system instead of one per row (also shrinks the pickle sidecar)
+    system_folder = sys.intern(system_folder)
+    stem = _stem(fn)
+    stem_lower = stem.lower()
+    cand_regions, cand_penalty = _candidate_features(stem_lower)
+    row = (system_folder, fn, raw_url, blob_url, key, abs_path, stem_lower, len(stem), cand_regions, cand_penalty)
+    CACHE.append(row)
+    CACHE_BY_SYS.setdefault(system_folder, []).append(row)
+    for scope in (system_folder, None):
+        STEM_INDEX.setdefault((scope, stem_lower), row)
+        KEY_INDEX.setdefault((scope, key), row)
+    _SYSTEMS_FROM_CACHE.add(system_folder)
+
+def _parse_boxart_tsv():
+    # The TSV is unquoted, so a plain readline + str.split loop is the fastest stdlib reader here
+    # (about 2x faster than csv.reader or mmap + bytes.split with per-field decode on a 130k-row
+    # cache); the pickle sidecar skips this anyway.
     with open(BOXART_CACHE_FILE, encoding='utf-8') as f:
         first = f.readline()
         if not first:
@@ -120,18 +225,83 @@ def _load_boxart_cache():
             parts = line.rstrip('\n').split('\t')
             if len(parts) < 5:
                 continue
-            key, system_folder, fn, raw_url, blob_url = parts[:5]
-            CACHE.append((system_folder, fn, raw_url, blob_url, key))
-            _SYSTEMS_FROM_CACHE.add(system_folder)
-    print(f"Loaded {len(CACHE):,} box art entries from cache.", flush=True)
+            _add_cache_row(*parts[:6])
 
-def _canon_system(hint: str):
-    if not hint:
-        return None
-    return SYSTEM_MAP.get(hint, hint)
+def _mmap_for_read(f):
+    if hasattr(mmap, 'MAP_POPULATE'):
+        # Linux: prefault the whole file in one go
+        return mmap.mmap(f.fileno(), 0, flags=mmap.MAP_PRIVATE | mmap.MAP_POPULATE, prot=mmap.PROT_READ)
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+def _tsv_identity():
+    # exact match instead of "pickle newer than TSV": survives cp -p / rsync -a of an older
+    # TSV and two caches that share a stem (and therefore a sidecar)
+    st = os.stat(BOXART_CACHE_FILE)
+    return (os.path.abspath(BOXART_CACHE_FILE), st.st_size, st.st_mtime_ns)
+
+def _load_boxart_pickle(source) -> bool:
+    try:
+        with open(BOXART_CACHE_PICKLE, 'rb') as f, _mmap_for_read(f) as mm:
+            data = pickle.loads(mm)
+    except FileNotFoundError:
+        return False
+    except Exception as e:
+        print(f"Ignoring unreadable {BOXART_CACHE_PICKLE}: {e}", flush=True)
+        return False
+    if not isinstance(data, tuple) or data[0] != _cache_pickle_fingerprint():
+        print(f"Rebuilding {BOXART_CACHE_PICKLE}: saved with a different format or qualifier/region words", flush=True)
+        return False
+    if data[1] != source:
+        print(f"Rebuilding {BOXART_CACHE_PICKLE}: {BOXART_CACHE_FILE} changed", flush=True)
+        return False
+    _, _, rows, by_sys, stem_index, key_index, systems = data
+    CACHE.extend(rows)
+    CACHE_BY_SYS.update(by_sys)
+    STEM_INDEX.update(stem_index)
+    KEY_INDEX.update(key_index)
+    _SYSTEMS_FROM_CACHE.update(systems)
+    return True
+
+def _save_boxart_pickle(source):
+    data = (_cache_pickle_fingerprint(), source, CACHE, CACHE_BY_SYS, STEM_INDEX, KEY_INDEX, _SYSTEMS_FROM_CACHE)
+    tmp = BOXART_CACHE_PICKLE + '.tmp'
+    try:
+        with open(tmp, 'wb') as f:
+            pickle.dump(data, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, BOXART_CACHE_PICKLE)
+    except Exception as e:
+        print(f"Could not write {BOXART_CACHE_PICKLE}: {e}", flush=True)
+
+def _build_keylen_index():
+    for scope, rows in [*CACHE_BY_SYS.items(), (None, CACHE)]:
+        rows = sorted(rows, key=lambda r: len(r[4]))
+        KEYLEN_INDEX[scope] = ([len(r[4]) for r in rows], rows)
+
+def _fuzzy_len_window(tlen: int) -> int:
+    # keys further than this from the title key's length are not worth a fuzzy comparison
+    return max(4, tlen // 3)
+
+def _load_boxart_cache():
+    # Runs once from main(); the indexes are built even when the cache is
+    # missing so lookups never need an "is it loaded?" check.
+    if not os.path.isfile(BOXART_CACHE_FILE):
+        print(f"Box art cache not found: {BOXART_CACHE_FILE}\nRun build_boxart_cache.py first.", flush=True)
+    else:
+        source = _tsv_identity()  # taken before parsing, so a TSV rewritten mid-parse isn't trusted later
+        if not _load_boxart_pickle(source):
+            _parse_boxart_tsv()
+            if CACHE:
+                _save_boxart_pickle(source)
+    _build_keylen_index()
+    if CACHE:
+        print(f"Loaded {len(CACHE):,} box art entries from cache.", flush=True)
 
 CONFIDENCE_MIN_SCOPED = 80   # require this score if we have a system match
 CONFIDENCE_MIN_UNSCOPED = 90 # stricter if we had to search globally
+# Fuzzy-only candidates top out at 60 (+5 region) and can never clear the thresholds above,
+# so their similarity is only worth computing when it is at least plausible.
+FUZZY_RATIO_CUTOFF = 0.6
+FUZZY_TOP_K = 20  # with rapidfuzz, only this many closest keys get the full fuzzy score
 PRETTY_SYSTEMS = [
     "Adventure Vision","Arcadia 2001","Atari 2600","Atari 5200","Atari 7800","Atari Lynx",
     "Bally Astrocade","Casio PV-1000","Channel F","ColecoVision","Famicom Disk System",
@@ -153,37 +323,71 @@ PRETTY_SYSTEMS = [
 ]
 
 def _tok(s: str):
-    return re.findall(r"[a-z0-9]+", (s or "").lower())
+    return _TOK_RE.findall((s or "").lower())
+
+@lru_cache(maxsize=None)
+def _sys_tokens(name: str):
+    # cache system names are scored against every hint; tokenize each name once
+    toks = _tok(name)
+    return " ".join(toks), frozenset(toks)
 
 def _sys_match_score(pretty: str, canon: str) -> float:
-    a, b = " ".join(_tok(pretty)), " ".join(_tok(canon))
-    r = SequenceMatcher(None, a, b).ratio()
-    ta, tb = set(_tok(pretty)), set(_tok(canon))
+    a, ta = _sys_tokens(pretty)
+    b, tb = _sys_tokens(canon)
+    r = _ratio(a, b)
     overlap = len(ta & tb)
     return r + min(0.10 * overlap, 0.30)  # small bonus for token overlap
 
 def _best_system_from_cache(name: str):
     if not _SYSTEMS_FROM_CACHE:
         return None
-    scored = [(_sys_match_score(name, s), s) for s in _SYSTEMS_FROM_CACHE]
-    scored.sort(reverse=True)
-    score, best = scored[0]
-    return (score, best)
+    return max((_sys_match_score(name, s), s) for s in _SYSTEMS_FROM_CACHE)
+
+_ALIASES_VERSION = 1  # bump when alias matching changes
+
+def _aliases_fingerprint() -> str:
+    h = hashlib.sha1(str(_ALIASES_VERSION).encode())
+    for name in [*sorted(_SYSTEMS_FROM_CACHE), '\0', *PRETTY_SYSTEMS]:
+        h.update(name.encode('utf-8') + b'\n')
+    return h.hexdigest()
+
+def _load_system_aliases(fingerprint: str):
+    try:
+        with open(BOXART_ALIASES_FILE, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        print(f"Ignoring unreadable {BOXART_ALIASES_FILE}: {e}", flush=True)
+        return None
+    if not isinstance(data, dict) or data.get('fingerprint') != fingerprint:
+        return None
+    return data.get('aliases')
+
+def _save_system_aliases(fingerprint: str, aliases: dict):
+    try:
+        with open(BOXART_ALIASES_FILE, 'w', encoding='utf-8') as f:
+            json.dump({'fingerprint': fingerprint, 'aliases': aliases}, f, indent=1)
+    except Exception as e:
+        print(f"Could not write {BOXART_ALIASES_FILE}: {e}", flush=True)
 
 def _build_system_aliases():
     # Build once, after cache is loaded
     global _SYSTEM_ALIAS_MAP
-    if _SYSTEM_ALIAS_MAP is not None:
-        return
-    _SYSTEM_ALIAS_MAP = {}
-    for pretty in PRETTY_SYSTEMS:
-        got = _best_system_from_cache(pretty)
-        if not got:
-            continue
-        score, canon = got
-        # Require a decent match so we don't create bad aliases
-        if score >= 0.75:
-            _SYSTEM_ALIAS_MAP[pretty] = canon
+    fingerprint = _aliases_fingerprint()
+    _SYSTEM_ALIAS_MAP = _load_system_aliases(fingerprint)
+    if _SYSTEM_ALIAS_MAP is None:
+        _SYSTEM_ALIAS_MAP = {}
+        for pretty in PRETTY_SYSTEMS:
+            got = _best_system_from_cache(pretty)
+            if not got:
+                continue
+            score, canon = got
+            # Require a decent match so we don't create bad aliases
+            if score >= 0.75:
+                _SYSTEM_ALIAS_MAP[pretty] = canon
+        if _SYSTEMS_FROM_CACHE:
+            _save_system_aliases(fingerprint, _SYSTEM_ALIAS_MAP)
     # Add a few common extra aliases that aren't in PRETTY_SYSTEMS
     extras = {
         "PSX": "Sony PlayStation",
@@ -208,12 +412,10 @@ def _build_system_aliases():
 def _canon_system(hint: str):
     if not hint:
         return None
-    _build_boxart_ready = bool(CACHE) and bool(_SYSTEMS_FROM_CACHE)
-    if not _build_boxart_ready:
-        _load_boxart_cache()
-    _build_system_aliases()
 
-    # direct alias first
+    # hand-maintained names (when that folder is in this cache), then aliases derived from PRETTY_SYSTEMS
+    if SYSTEM_MAP.get(hint) in _SYSTEMS_FROM_CACHE:
+        return SYSTEM_MAP[hint]
     if hint in _SYSTEM_ALIAS_MAP:
         return _SYSTEM_ALIAS_MAP[hint]
 
@@ -234,19 +436,33 @@ def _canon_system(hint: str):
 def _stem(name: str) -> str:
     return os.path.splitext(name)[0]
 
-def _paren_tokens(stem: str):
-    return [t.strip().lower() for t in re.findall(r"\((.*?)\)", stem)]
+def _paren_tokens(stem_lower: str):
+    # callers lower the whole string once instead of every token
+    return [t.strip() for t in _PAREN_RE.findall(stem_lower)]
 
 def _region_tokens_from_title(title: str):
-    return set(t for t in _paren_tokens(title) if any(r in t for r in REGION_WORDS))
+    return set(t for t in _paren_tokens((title or "").lower()) if _REGION_RE.search(t))
 
 def _base_tokens(title: str):
     # non-parenthetical, longish tokens (helps kill "Anniversary Edition" false matches)
-    base = re.sub(r"\s*\([^)]*\)", "", title or "")
-    toks = re.findall(r"[A-Za-z0-9]+", base.lower())
+    toks = _TOK_RE.findall(_PAREN_STRIP_RE.sub("", title or "").lower())
     return [t for t in toks if len(t) >= 4]
 
-def _score_candidate(stem: str, key: str, target_key: str, region_hint: set, target_stem_len: int, base_tokens) -> int:
+def _candidate_features(stem_lower: str):
+    # Title-independent part of the score: region tags and qualifier/extra-tag penalties
+    cand_paren = _paren_tokens(stem_lower)
+    cand_regions = frozenset(t for t in cand_paren if _REGION_RE.search(t))
+    penalty = 0
+    cand_blob = " ".join(cand_paren)
+    if _BAD_RE.search(cand_blob):
+        penalty += 30
+    if _SOFT_RE.search(cand_blob):
+        penalty += 5
+    penalty += 3 * sum(1 for t in cand_paren if t not in cand_regions)
+    return cand_regions, penalty
+
+def _score_candidate(key: str, stem_len: int, cand_regions: frozenset, cand_penalty: int,
+                     target_key: str, region_hint: set, target_stem_len: int, base_tokens) -> int:
     if key == target_key:
         base = 100
     elif key.startswith(target_key) or target_key.startswith(key):
@@ -254,94 +470,158 @@ def _score_candidate(stem: str, key: str, target_key: str, region_hint: set, tar
     elif target_key in key:
         base = 92
     else:
-        base = int(60 * SequenceMatcher(None, target_key, key).ratio())
+        if abs(len(key) - len(target_key)) > _fuzzy_len_window(len(target_key)):
+            base = 0
+        else:
+            base = int(60 * _ratio(target_key, key, FUZZY_RATIO_CUTOFF))
 
-    cand_paren = _paren_tokens(stem)
-    cand_regions = set(t for t in cand_paren if any(r in t for r in REGION_WORDS))
     if region_hint and (cand_regions & region_hint):
         base += 5
-
-    cand_blob = " ".join(cand_paren)
-    if any(q in cand_blob for q in BAD_QUALIFIERS):
-        base -= 30
-    if any(q in cand_blob for q in SOFT_QUALIFIERS):
-        base -= 5
-
-    non_region_extras = [t for t in cand_paren if t not in cand_regions]
-    if non_region_extras:
-        base -= 3 * len(non_region_extras)
+    base -= cand_penalty
 
     # must share at least one strong base token; otherwise heavily penalize
     if base_tokens and not any(t in key for t in base_tokens):
         base -= 40
 
-    base -= min(5, max(0, (len(stem) - target_stem_len) // 10))
+    base -= min(5, max(0, (stem_len - target_stem_len) // 10))
     return base
 
+@lru_cache(maxsize=1024)
 def find_boxart_and_url(system_hint: str, game_name: str):
-    _load_boxart_cache()
-    if not CACHE:
-        return None, None
-
     target_key = _normalize_key(game_name)
-    region_hint = _region_tokens_from_title(game_name)
+    title_stem = _stem(game_name)
     sys_hint = _canon_system(system_hint)
-    target_stem_len = len(_stem(game_name))
+
+    scoped = CACHE_BY_SYS.get(sys_hint, []) if sys_hint else []
+    candidates = scoped or CACHE
+    scope = sys_hint if scoped else None
+
+    hit = STEM_INDEX.get((scope, title_stem.lower()))
+    if hit:
+        print(f"Boxart match (exact stem): [{hit[0]}] {hit[1]}", flush=True)
+        return hit[2], hit[3], hit[5]
+    hit = KEY_INDEX.get((scope, target_key))
+    if hit:
+        print(f"Boxart match (exact key): [{hit[0]}] {hit[1]}", flush=True)
+        return hit[2], hit[3], hit[5]
+
+    region_hint = _region_tokens_from_title(game_name)
+    target_stem_len = len(title_stem)
     base_tokens = _base_tokens(game_name)
 
-    candidates = CACHE
-    scoped = []
-    if sys_hint:
-        scoped = [t for t in CACHE if t[0] == sys_hint]
-        if scoped:
-            candidates = scoped
-
-    lowered_title_stem = _stem(game_name).lower()
-    for sys_folder, fn, raw_url, blob_url, key in candidates:
-        if _stem(fn).lower() == lowered_title_stem:
-            print(f"Boxart match (exact stem): [{sys_folder}] {fn}", flush=True)
-            return raw_url, blob_url
-
-    scored = []
-    for sys_folder, fn, raw_url, blob_url, key in candidates:
-        score = _score_candidate(_stem(fn), key, target_key, region_hint, target_stem_len, base_tokens)
-        scored.append((score, len(fn), sys_folder, fn, raw_url, blob_url, key))
-
-    if not scored:
-        print(f"No boxart in cache for '{game_name}'", flush=True)
-        return None, None
-
-    scored.sort(reverse=True)
-    top_score, _, top_sys, top_fn, top_raw, top_blob, _ = scored[0]
+    # Only keys that contain the title key or prefix it can clear the confidence thresholds, and
+    # C-level str ops find those without a Python call per row. The fuzzy pass only runs when
+    # nothing overlaps, to report how close the best miss was, and only over the slice of
+    # similar-length keys (everything else scores zero there anyway).
+    pool = [r for r in candidates if target_key in r[4] or target_key.startswith(r[4])]
+    if not pool:
+        lens, by_len = KEYLEN_INDEX[scope]
+        tlen, window = len(target_key), _fuzzy_len_window(len(target_key))
+        pool = by_len[bisect.bisect_left(lens, tlen - window):bisect.bisect_right(lens, tlen + window)]
+        if _rf_process is not None and len(pool) > FUZZY_TOP_K:
+            # one batched C call ranks every key; Python scoring only runs on the closest few
+            top = _rf_process.extract(target_key, [r[4] for r in pool], scorer=_indel.normalized_similarity,
+                                      score_cutoff=FUZZY_RATIO_CUTOFF, limit=FUZZY_TOP_K)
+            pool = [pool[i] for _, _, i in top]
+    if not pool:
+        print(f"No boxart candidates in cache for '{game_name}'", flush=True)
+        return None, None, None
+
+    if BOXART_DEBUG:
+        top = heapq.nlargest(5, ((_score_candidate(key, stem_len, cand_regions, cand_penalty,
+                                                   target_key, region_hint, target_stem_len, base_tokens),
+                                  len(fn), sys_folder, fn, raw_url, blob_url, abs_path)
+                                 for sys_folder, fn, raw_url, blob_url, key, abs_path, _, stem_len, cand_regions, cand_penalty in pool))
+        for score, _, sys_folder, fn, *_ in top:
+            print(f"  candidate {score:4d}: [{sys_folder}] {fn}", flush=True)
+        top_score, _, top_sys, top_fn, top_raw, top_blob, top_path = top[0]
+    else:
+        # running argmax, same order as the tuples above: score, then longer filename,
+        # then (system, filename); no per-candidate tuple is built
+        best, top_score, best_len = None, 0, 0
+        for row in pool:
+            score = _score_candidate(row[4], row[7], row[8], row[9],
+                                     target_key, region_hint, target_stem_len, base_tokens)
+            if best is not None and score < top_score:
+                continue
+            n = len(row[1])
+            if best is None or score > top_score or n > best_len or (n == best_len and row[:2] > best[:2]):
+                best, top_score, best_len = row, score, n
+        top_sys, top_fn, top_raw, top_blob, _, top_path = best[:6]
+
     min_needed = CONFIDENCE_MIN_SCOPED if scoped else CONFIDENCE_MIN_UNSCOPED
     if top_score < min_needed:
         print(f"Low-confidence match (score {top_score} < {min_needed}); skipping image.", flush=True)
-        return None, None
+        return None, None, None
     if sys_hint and top_sys != sys_hint:
         print(f"Top match is from different system [{top_sys}] than hint [{sys_hint}]; skipping image.", flush=True)
-        return None, None
+        return None, None, None
 
     print(f"Boxart match (scored {top_score}): [{top_sys}] {top_fn}", flush=True)
-    return top_raw, top_blob
+    return top_raw, top_blob, top_path
+
+# One pooled keep-alive session for image checks and MiSTer polling, so neither reconnects each time
+SESSION = requests.Session()
+SESSION.mount('https://', HTTPAdapter(pool_connections=4, pool_maxsize=8))
+
+def _load_image_checks() -> dict:
+    try:
+        with open(IMAGE_CHECKS_FILE, encoding='utf-8') as f:
+            data = json.load(f)
+    except FileNotFoundError:
+        return {}
+    except Exception as e:
+        print(f"Ignoring unreadable {IMAGE_CHECKS_FILE}: {e}", flush=True)
+        return {}
+    return {k: (True, 0.0) for k, v in data.items() if v is True} if isinstance(data, dict) else {}
+
+def _save_image_checks():
+    # only confirmed images are persisted; a failed check is retried on the next run
+    try:
+        with open(IMAGE_CHECKS_FILE, 'w', encoding='utf-8') as f:
+            json.dump({k: True for k, (ok, _) in _IMAGE_OK.items() if ok}, f)
+    except Exception as e:
+        print(f"Could not write {IMAGE_CHECKS_FILE}: {e}", flush=True)
+
+# url -> (verdict, time.monotonic() of the check), only for definite answers (see _IMAGE_MISSING_STATUS).
+# Confirmed images never expire; a definite miss is re-checked after IMAGE_CHECK_TTL.
+_IMAGE_OK = _load_image_checks()
+IMAGE_CHECK_TTL = 3600
+# Only these (and a 200) are a real answer about the image; 429/5xx etc. are retried next poll
+_IMAGE_MISSING_STATUS = (403, 404, 410)
 
 def is_valid_image(url: str) -> bool:
+    cached = _IMAGE_OK.get(url)
+    if cached and (cached[0] or time.monotonic() - cached[1] < IMAGE_CHECK_TTL):
+        return cached[0]
     try:
-        r = requests.head(url, timeout=5, allow_redirects=True)
-        if r.status_code == 200 and 'image' in r.headers.get('Content-Type', ''):
-            return True
-        r = requests.get(url, timeout=7, stream=True)
-        ct = r.headers.get('Content-Type', '')
-        return r.status_code == 200 and 'image' in ct
+        # raw.githubusercontent.com answers HEAD with the real Content-Type, so no GET fallback
+        r = SESSION.head(url, timeout=5, allow_redirects=True)
     except Exception as e:
         print(f"Image check failed for {url}: {e}", flush=True)
         return False
+    if r.status_code != 200 and r.status_code not in _IMAGE_MISSING_STATUS:
+        print(f"Image check for {url} got HTTP {r.status_code}; will retry", flush=True)
+        return False
+    ok = r.status_code == 200 and 'image' in r.headers.get('Content-Type', '')
+    _IMAGE_OK[url] = (ok, time.monotonic())
+    if ok:
+        _save_image_checks()
+    return ok
+
+def _boxart_available(url: str, local_path: str) -> bool:
+    # The cache is built from a local checkout of the thumbnail repos; if the PNG
+    # is still on disk the raw URL serves it too, so skip the network check.
+    if local_path and os.path.isfile(local_path):
+        return True
+    return is_valid_image(url)
 
 # --- MiSTer API ---
 def fetch_playing(host, port):
     try:
-        resp = requests.get(f"http://{host}:{port}/api/games/playing", timeout=5)
+        resp = SESSION.get(f"http://{host}:{port}/api/games/playing", timeout=5)
         resp.raise_for_status()
-        return resp.json()
+        return orjson.loads(resp.content) if orjson is not None else resp.json()
     except Exception as e:
         print(f"Error fetching playing info: {e}", flush=True)
         return None
@@ -357,14 +637,47 @@ def format_elapsed(start):
         return f"for {h}h {m}m"
     return f"for {m}m"
 
+PRESENCE_REFRESH = 300  # seconds; resend an unchanged payload this often (e.g. after a Discord restart)
+_last_sent = (None, 0.0)  # (payload, time.monotonic()) of the last RPC.update
+
+def _send_presence(payload):
+    global _last_sent
+    # Discord renders elapsed time from 'start' itself, so an identical payload needs no IPC write
+    if payload == _last_sent[0] and time.monotonic() - _last_sent[1] < PRESENCE_REFRESH:
+        return
+    print(f"Updating presence: {payload['details']} on {payload['state']} "
+          f"{format_elapsed(datetime.fromtimestamp(payload['start']))}", flush=True)
+    try:
+        RPC.update(**payload)
+    except PipeClosed:
+        print("Discord pipe closed, reconnecting...", flush=True)
+        try:
+            RPC.close()
+        except:
+            pass
+        RPC.connect()
+        RPC.update(**payload)
+    _last_sent = (payload, time.monotonic())
+
+_last_presence = None  # ((core, system, game), payload) of the previous update
+
 def set_presence(data, start_time, last_game):
+    global _last_presence
     raw_boxart_url = None
     github_blob_url = None
+    boxart_path = None
     small_asset = IMAGE_KEY
     core = data.get('core', '') if data else ''
     system = data.get('systemName', '') if data else ''
     game = data.get('gameName', '') if data else ''
 
+    # Same thing still playing: the payload (start time included) is unchanged, so skip
+    # the asset/box art lookups and their logging and resend what we built last time.
+    playing = (core, system, game)
+    if _last_presence and _last_presence[0] == playing and f"{system}/{game}" == last_game:
+        _send_presence(_last_presence[1])
+        return start_time, last_game
+
     if not system and not game:
         details = "In Menu"
         state = "MiSTer FPGA"
@@ -375,7 +688,7 @@ def set_presence(data, start_time, last_game):
         if hint and hint in ASSETS:
             small_asset = ASSETS[hint]
             print(f"Using small_image asset: {small_asset} for '{hint}'", flush=True)
-        raw_boxart_url, github_blob_url = find_boxart_and_url(system, game)
+        raw_boxart_url, github_blob_url, boxart_path = find_boxart_and_url(system, game)
         if raw_boxart_url:
             print(f"Using boxart URL: {raw_boxart_url}", flush=True)
         else:
@@ -389,14 +702,11 @@ def set_presence(data, start_time, last_game):
         start_time = datetime.now()
         last_game = current
 
-    elapsed = format_elapsed(start_time)
-    print(f"Updating presence: {details} on {state} {elapsed}", flush=True)
-
     payload = {
         'details': details,
         'state': state,
         'start': int(start_time.timestamp()),
-        'large_image': (raw_boxart_url if (raw_boxart_url and is_valid_image(raw_boxart_url)) else IMAGE_KEY),
+        'large_image': (raw_boxart_url if (raw_boxart_url and _boxart_available(raw_boxart_url, boxart_path)) else IMAGE_KEY),
         'large_text': details,
         'small_image': small_asset,
         'small_text': state
@@ -404,19 +714,18 @@ def set_presence(data, start_time, last_game):
     print(f"large_image => {payload['large_image']} | small_image => {payload.get('small_image')}", flush=True)
     if github_blob_url:
         payload['buttons'] = [{"label": "Box Art", "url": github_blob_url}]
-    try:
-        RPC.update(**payload)
-    except PipeClosed:
-        print("Discord pipe closed, reconnecting...", flush=True)
-        try:
-            RPC.close()
-        except:
-            pass
-        RPC.connect()
-        RPC.update(**payload)
+    # Only reuse a payload whose box art is settled; when the image check fell back to the
+    # asset, go through is_valid_image again next poll (network errors, 429 and 5xx aren't cached)
+    _last_presence = None if (raw_boxart_url and payload['large_image'] == IMAGE_KEY) else (playing, payload)
+    _send_presence(payload)
 
     return start_time, last_game
 
+POLL_INTERVAL_MIN = 5    # seconds, right after a game change
+POLL_INTERVAL_MAX = 60   # ceiling while the same game keeps playing
+POLL_INTERVAL_MENU = 15  # ceiling in the menu (the old fixed rate), so a launched game shows up quickly
+POLL_BACKOFF = 1.5
+
 def main():
     host = sys.argv[1] if len(sys.argv) > 1 else mister_host
     port = sys.argv[2] if len(sys.argv) > 2 else mister_port
@@ -427,13 +736,29 @@ def main():
         return
     print(f"Connected to Discord RPC (Client ID: {client_id})", flush=True)
 
+    # Load everything the lookups need up front, so the first game change does no setup work
+    try:
+        _load_boxart_cache()
+    except Exception as e:
+        print(f"Could not load box art cache {BOXART_CACHE_FILE}: {e}", flush=True)
+        _build_keylen_index()
+    _build_system_aliases()
+
     start_time = datetime.now()
     last_game = None
+    interval = POLL_INTERVAL_MIN
     try:
         while True:
             data = fetch_playing(host, port)
+            prev_game = last_game
             start_time, last_game = set_presence(data, start_time, last_game)
-            time.sleep(15)
+            # poll fast right after a change, back off while the same thing keeps playing
+            if last_game != prev_game:
+                interval = POLL_INTERVAL_MIN
+            else:
+                in_menu = last_game == "/"  # set_presence's key when no system/game is reported
+                interval = min(POLL_INTERVAL_MENU if in_menu else POLL_INTERVAL_MAX, interval * POLL_BACKOFF)
+            time.sleep(interval)
     except KeyboardInterrupt:
         print("Disconnecting from Discord...", flush=True)
         try: